@@ -1,20 +1,44 @@
 #display annotation in textbox pixels value at textbox, normalize value at .txt
 #Added Resolution Label
 #shows the actual pixel position within the image, not the widget position
+import bisect
+import io
 import json
 import os
 import sys
+import threading
+import time
 
-from PIL import Image, ExifTags
-from PyQt5.QtCore import QPoint, Qt, QRectF, QPointF
-from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QPen
+_STARTUP_T0 = time.perf_counter()
+
+from PyQt5.QtCore import QPoint, Qt, QRectF, QPointF, QTimer, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QPen, QPolygonF, QStaticText
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QTabWidget,
                              QVBoxLayout, QHBoxLayout, QListWidget, QPushButton,
                              QLabel, QLineEdit, QTextEdit, QFileDialog, QInputDialog,
-                             QSplitter, QMessageBox)
+                             QSplitter, QMessageBox, QSpinBox)
+
+# Config lives next to the script, not in whatever directory the editor was launched from
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config_path.json")
+THROUGHPUT_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "throughput_log.jsonl")
+# File list of the last folder, kept out of the config so startup never parses it on the UI thread
+IMAGE_LIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_list.json")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".raw")
+# Opened through a WindowedImage: decoded per viewport where the file layout allows
+WINDOWED_EXTENSIONS = (".tif", ".tiff", ".raw")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+STARTUP_TARGET_MS = 800  # window shown and event loop running within this budget
+
+
+def list_images(folder):
+    # A .raw frame is only listed with its <file>.raw.json sidecar, it cannot be opened without one
+    return sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS)
+                  and (not f.lower().endswith(".raw") or os.path.exists(os.path.join(folder, f + ".json"))))
 
 
 def load_image_correct_orientation(image_path):
+    # PIL is only needed once the first image is opened, keep it off the startup path
+    from PIL import Image, ExifTags
     try:
         pil_img = Image.open(image_path)
         try:
@@ -30,21 +54,1166 @@ def load_image_correct_orientation(image_path):
                     pil_img = pil_img.rotate(90, expand=True)
         except Exception as e:
             print("EXIF read failed:", e)
-        pil_img = pil_img.convert("RGB")
-        data = pil_img.tobytes("raw", "RGB")
-        qimage = QImage(data, pil_img.width, pil_img.height, QImage.Format_RGB888)
-        return qimage
+        return pil_to_qimage(pil_img)
     except Exception as e:
         print(f"Failed to load image {image_path}: {e}")
         return QImage()
 
 
+def pil_to_qimage(pil_img):
+    pil_img = pil_img.convert("RGB")
+    data = pil_img.tobytes("raw", "RGB")
+    return QImage(data, pil_img.width, pil_img.height, pil_img.width * 3, QImage.Format_RGB888).copy()
+
+
+# Packed label shard: one memory-mappable file holding every YOLO box of a folder.
+#   magic (8 bytes) | header length (uint64 LE) | JSON header | padding | arrays
+# Arrays start on SHARD_ALIGN boundaries; header["arrays"] gives dtype, shape and the
+# offset of each one relative to the start of the array section.
+SHARD_MAGIC = b"YLBLSHD1"
+SHARD_ALIGN = 64
+SHARD_EXTENSION = ".ylbl"
+
+
+def _align(n):
+    return (n + SHARD_ALIGN - 1) // SHARD_ALIGN * SHARD_ALIGN
+
+
+def read_yolo_txt(txt_path):
+    rows = []
+    if os.path.exists(txt_path):
+        with open(txt_path, "r") as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) == 5:
+                    rows.append((int(float(parts[0])), *map(float, parts[1:])))
+    return rows
+
+
+def rect_to_yolo(rect, w, h):
+    # Convert pixel coordinates to normalized YOLO format (0-1 range)--kua4
+    x = (rect.x() + rect.width() / 2) / w  # center x (normalized)
+    y = (rect.y() + rect.height() / 2) / h  # center y (normalized)
+    ww = rect.width() / w  # width (normalized)
+    hh = rect.height() / h  # height (normalized)
+    return x, y, ww, hh
+
+
+def yolo_to_rect(cx, cy, ww, hh, w, h):
+    return QRectF((cx - ww / 2) * w, (cy - hh / 2) * h, ww * w, hh * h)
+
+
+def export_label_shard(folder, out_path, include_images=False, shard_bytes=1 << 30):
+    """Pack classes.txt and every image's YOLO .txt in folder into a single shard file.
+
+    With include_images the encoded image files are also concatenated into
+    <out_path>.NNN.bin shards of at most shard_bytes each.
+    """
+    import numpy as np
+
+    classes_path = os.path.join(folder, "classes.txt")
+    class_names = []
+    if os.path.exists(classes_path):
+        with open(classes_path, "r") as f:
+            class_names = [line.strip() for line in f if line.strip()]
+    image_names = list_images(folder)
+
+    n = len(image_names)
+    offsets = np.zeros(n + 1, dtype="<i8")
+    class_ids, boxes = [], []
+    for i, name in enumerate(image_names):
+        rows = read_yolo_txt(os.path.join(folder, os.path.splitext(name)[0] + ".txt"))
+        class_ids.extend(r[0] for r in rows)
+        boxes.extend(r[1:] for r in rows)
+        offsets[i + 1] = offsets[i] + len(rows)
+
+    arrays = {
+        "offsets": offsets,
+        "class_ids": np.asarray(class_ids, dtype="<i4"),
+        "boxes": np.asarray(boxes, dtype="<f4").reshape(-1, 4),  # cx, cy, w, h normalized
+    }
+
+    image_shards = []
+    if include_images:
+        shard_ids = np.full(n, -1, dtype="<i4")
+        starts = np.zeros(n, dtype="<i8")
+        lengths = np.zeros(n, dtype="<i8")
+        out = None
+        for i, name in enumerate(image_names):
+            with open(os.path.join(folder, name), "rb") as f:
+                data = f.read()
+            if out is None or (out.tell() and out.tell() + len(data) > shard_bytes):
+                if out is not None:
+                    out.close()
+                shard_name = f"{os.path.basename(out_path)}.{len(image_shards):03d}.bin"
+                image_shards.append(shard_name)
+                out = open(os.path.join(os.path.dirname(os.path.abspath(out_path)), shard_name), "wb")
+            shard_ids[i] = len(image_shards) - 1
+            starts[i] = out.tell()
+            lengths[i] = len(data)
+            out.write(data)
+        if out is not None:
+            out.close()
+        arrays.update(image_shard=shard_ids, image_start=starts, image_length=lengths)
+
+    specs, pos = {}, 0
+    for key, arr in arrays.items():
+        specs[key] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": pos}
+        pos = _align(pos + arr.nbytes)
+    header = json.dumps({
+        "version": 1,
+        "classes": class_names,
+        "images": image_names,
+        "image_root": os.path.abspath(folder),
+        "image_shards": image_shards,
+        "arrays": specs,
+    }).encode("utf-8")
+
+    with open(out_path, "wb") as f:
+        f.write(SHARD_MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        data_start = _align(f.tell())
+        for key, arr in arrays.items():
+            f.seek(data_start + specs[key]["offset"])
+            f.write(arr.tobytes())
+        f.truncate(data_start + pos)
+    print(f"[SHARD] {out_path} - {n} images, {len(class_ids)} boxes, {len(image_shards)} image shards")
+    return out_path
+
+
+class LabelShard:
+    """Read-only, memory-mapped view of a file written by export_label_shard.
+
+    Every lookup by image index is O(1) and returns numpy views into the mapping,
+    nothing is copied or parsed per image.
+    """
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(SHARD_MAGIC)) != SHARD_MAGIC:
+                raise ValueError(f"{path} is not a label shard")
+            header_len = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_len).decode("utf-8"))
+        self.class_names = header["classes"]
+        self.image_names = header["images"]
+        self.image_root = header["image_root"]
+
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        data_start = _align(len(SHARD_MAGIC) + 8 + header_len)
+        self.arrays = {}
+        for key, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            start = data_start + spec["offset"]
+            raw = self._map[start:start + count * dtype.itemsize]
+            self.arrays[key] = raw.view(dtype).reshape(spec["shape"])
+
+        shard_dir = os.path.dirname(os.path.abspath(path))
+        self._image_maps = [np.memmap(os.path.join(shard_dir, name), dtype=np.uint8, mode="r")
+                            for name in header["image_shards"]]
+
+    def __len__(self):
+        return len(self.image_names)
+
+    @property
+    def has_images(self):
+        return bool(self._image_maps)
+
+    def image_path(self, index):
+        return os.path.join(self.image_root, self.image_names[index])
+
+    def labels(self, index):
+        """Return (class_ids, boxes) views for one image; boxes are normalized cx, cy, w, h."""
+        offsets = self.arrays["offsets"]
+        start, end = offsets[index], offsets[index + 1]
+        return self.arrays["class_ids"][start:end], self.arrays["boxes"][start:end]
+
+    def image_bytes(self, index):
+        """Return a memoryview of the packed encoded image, or None if images were not packed."""
+        if not self._image_maps:
+            return None
+        shard = self.arrays["image_shard"][index]
+        if shard < 0:
+            return None
+        start = self.arrays["image_start"][index]
+        return memoryview(self._image_maps[shard][start:start + self.arrays["image_length"][index]])
+
+
+def unpack_label_shard(shard_path, out_dir):
+    """Write a shard back out as a loose folder: classes.txt, YOLO .txt files and packed images."""
+    shard = LabelShard(shard_path)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "classes.txt"), "w") as f:
+        for name in shard.class_names:
+            f.write(f"{name}\n")
+    for i, name in enumerate(shard.image_names):
+        class_ids, boxes = shard.labels(i)
+        if len(class_ids):
+            with open(os.path.join(out_dir, os.path.splitext(name)[0] + ".txt"), "w") as f:
+                for class_id, (x, y, ww, hh) in zip(class_ids.tolist(), boxes.tolist()):
+                    f.write(f"{class_id} {x:.6f} {y:.6f} {ww:.6f} {hh:.6f}\n")
+        data = shard.image_bytes(i)
+        if data is not None:
+            with open(os.path.join(out_dir, name), "wb") as f:
+                f.write(data)
+    print(f"[SHARD] {shard_path} unpacked to {out_dir}")
+
+
+def parse_frame_spec(spec, frame_count):
+    """Parse a frame selection such as "0-300:10, 512" into a sorted list of frame numbers."""
+    frames = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        step = 1
+        if ":" in part:
+            part, step = part.split(":")
+            step = max(1, int(step))
+        if "-" in part:
+            start, end = (int(v) for v in part.split("-"))
+        else:
+            start = end = int(part)
+        frames.update(range(max(0, start), min(end, frame_count - 1) + 1, step))
+    return sorted(frames)
+
+
+class VideoSequence:
+    """A video opened as an image sequence, with boxes interpolated between annotated keyframes.
+
+    Frames are located through a seek index built once by demuxing packets (no
+    decoding) and cached in <video>.seekidx.json, so a random frame is decoded
+    from the nearest preceding codec keyframe instead of from the start of the
+    file. The last FRAME_CACHE_SIZE decoded frames are kept, so stepping back
+    does not seek again. Annotated keyframes are stored in <video>.keyframes.json
+    as normalized YOLO rows.
+
+    Opening a video demuxes the whole file the first time; construct it on a
+    worker thread.
+    """
+
+    FRAME_CACHE_SIZE = 16
+
+    def __init__(self, path):
+        import av  # PyAV, only needed when a video is opened
+        from collections import OrderedDict
+
+        self.path = path
+        self.container = av.open(path)
+        self.stream = self.container.streams.video[0]
+        self.lock = threading.Lock()  # the decoder is shared by the UI and background workers
+        self.frame_pts, self.seek_frames = self.load_seek_index()
+        self.frame_of_pts = {pts: i for i, pts in enumerate(self.frame_pts)}
+        self.decoder = None
+        self.next_frame = None
+        self.recent = OrderedDict()  # frame number -> decoded av.VideoFrame
+        self.recent_lock = threading.Lock()  # cache hits must not wait behind a running decode
+        self.keyframes_path = path + ".keyframes.json"
+        self.keyframes = {}  # frame number -> [(class_id, cx, cy, w, h), ...]
+        if os.path.exists(self.keyframes_path):
+            with open(self.keyframes_path, "r") as f:
+                self.keyframes = {int(k): [tuple(row) for row in v] for k, v in json.load(f).items()}
+
+    def __len__(self):
+        return len(self.frame_pts)
+
+    def frame_name(self, n):
+        return f"{self.path}#{n:06d}"
+
+    def load_seek_index(self):
+        index_path = self.path + ".seekidx.json"
+        mtime = os.path.getmtime(self.path)
+        try:
+            with open(index_path, "r") as f:
+                cached = json.load(f)
+            if cached["mtime"] == mtime:
+                return cached["pts"], cached["seek_frames"]
+        except (OSError, ValueError, KeyError):
+            pass
+        pts, key_pts = [], set()
+        for packet in self.container.demux(self.stream):
+            if packet.pts is None:
+                continue
+            pts.append(packet.pts)
+            if packet.is_keyframe:
+                key_pts.add(packet.pts)
+        pts.sort()
+        seek_frames = [i for i, p in enumerate(pts) if p in key_pts] or [0]
+        try:
+            with open(index_path, "w") as f:
+                json.dump({"mtime": mtime, "pts": pts, "seek_frames": seek_frames}, f)
+        except Exception as e:
+            print("Failed to cache seek index:", e)
+        return pts, seek_frames
+
+    def cached_frame(self, n):
+        with self.recent_lock:
+            frame = self.recent.get(n)
+            if frame is not None:
+                self.recent.move_to_end(n)
+            return frame
+
+    def remember(self, n, frame):
+        with self.recent_lock:
+            self.recent[n] = frame
+            self.recent.move_to_end(n)
+            if len(self.recent) > self.FRAME_CACHE_SIZE:
+                self.recent.popitem(last=False)
+
+    def frame(self, n):
+        """Decode frame n and return it as a PIL image."""
+        cached = self.cached_frame(n)
+        if cached is not None:
+            return cached.to_image()
+        with self.lock:
+            cached = self.cached_frame(n)  # decoded by another worker while we waited
+            if cached is not None:
+                return cached.to_image()
+            seek = self.seek_frames[max(0, bisect.bisect_right(self.seek_frames, n) - 1)]
+            # Keep decoding forward when the decoder is already between the keyframe and n
+            if self.decoder is None or self.next_frame is None or not (seek <= self.next_frame <= n):
+                self.container.seek(self.frame_pts[seek], stream=self.stream)
+                self.decoder = self.container.decode(self.stream)
+            for frame in self.decoder:
+                i = self.frame_of_pts.get(frame.pts)
+                if i is None:
+                    continue
+                self.remember(i, frame)
+                if i >= n:
+                    self.next_frame = i + 1
+                    return frame.to_image()
+            self.decoder = None
+            raise IndexError(f"Frame {n} not found in {self.path}")
+
+    def frame_qimage(self, n):
+        try:
+            return pil_to_qimage(self.frame(n))
+        except Exception as e:
+            print(f"Failed to decode frame {n} of {self.path}: {e}")
+            return QImage()
+
+    def set_keyframe(self, n, rows):
+        self.keyframes[n] = [tuple(row) for row in rows]
+        with open(self.keyframes_path, "w") as f:
+            json.dump({str(k): v for k, v in sorted(self.keyframes.items())}, f)
+
+    def interpolate(self, a, b, frames):
+        """Linearly interpolate boxes of keyframes a and b for all frames in between at once.
+
+        The k-th box of a class in a is paired with the k-th box of that class in b;
+        boxes without a partner are not carried over.
+        """
+        import numpy as np
+
+        seen, pairs = {}, []
+        slots_b = {}
+        for j, row in enumerate(self.keyframes[b]):
+            slots_b.setdefault(row[0], []).append(j)
+        for i, row in enumerate(self.keyframes[a]):
+            k = seen[row[0]] = seen.get(row[0], -1) + 1
+            if k < len(slots_b.get(row[0], [])):
+                pairs.append((row[0], i, slots_b[row[0]][k]))
+        if not pairs:
+            return [[] for _ in frames]
+        classes = [c for c, _, _ in pairs]
+        box_a = np.array([self.keyframes[a][i][1:] for _, i, _ in pairs], dtype=np.float64)
+        box_b = np.array([self.keyframes[b][j][1:] for _, _, j in pairs], dtype=np.float64)
+        t = (np.asarray(frames, dtype=np.float64) - a) / (b - a)
+        boxes = box_a[None] + t[:, None, None] * (box_b - box_a)[None]  # (frames, boxes, 4)
+        return [[(c, *box) for c, box in zip(classes, frame_boxes)] for frame_boxes in boxes.tolist()]
+
+    def boxes_for_frames(self, frames):
+        """Return {frame: [(class_id, cx, cy, w, h), ...]} for the given frame numbers."""
+        keys = sorted(self.keyframes)
+        out, spans = {}, {}
+        for n in frames:
+            if n in self.keyframes:
+                out[n] = self.keyframes[n]
+                continue
+            j = bisect.bisect_right(keys, n)
+            if 0 < j < len(keys):
+                spans.setdefault((keys[j - 1], keys[j]), []).append(n)
+            else:
+                out[n] = []  # outside the annotated span, nothing to interpolate from
+        for (a, b), span_frames in spans.items():
+            out.update(zip(span_frames, self.interpolate(a, b, span_frames)))
+        return out
+
+    def export_frames(self, frames, out_dir, class_names):
+        """Write the given frames as <video>_fNNNNNN.jpg plus YOLO .txt pairs into out_dir."""
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, "classes.txt"), "w") as f:
+            for name in class_names:
+                f.write(f"{name}\n")
+        stem = os.path.splitext(os.path.basename(self.path))[0]
+        boxes = self.boxes_for_frames(frames)
+        for n in frames:
+            base = os.path.join(out_dir, f"{stem}_f{n:06d}")
+            self.frame(n).save(base + ".jpg", quality=95)
+            with open(base + ".txt", "w") as f:
+                for class_id, x, y, ww, hh in boxes[n]:
+                    f.write(f"{class_id} {x:.6f} {y:.6f} {ww:.6f} {hh:.6f}\n")
+        print(f"[VIDEO] Exported {len(frames)} frames of {self.path} to {out_dir}")
+        return len(frames)
+
+
+class WindowedImage:
+    """An image that is only ever decoded one viewport region at a time.
+
+    Subclasses provide read_region(); this class maps the raw (possibly 16-bit
+    or float) samples to 8-bit through an adjustable window/level, using a
+    lookup table for unsigned integer data, and caches the last rendered region.
+    """
+
+    def __init__(self, width, height, dtype):
+        import numpy as np
+
+        self.width, self.height = width, height
+        self.dtype = np.dtype(dtype)
+        if self.dtype.kind in "ui":
+            self.min_value, self.max_value = int(np.iinfo(self.dtype).min), int(np.iinfo(self.dtype).max)
+        else:
+            self.min_value, self.max_value = 0, 1
+        self.window = self.max_value - self.min_value
+        self.level = (self.max_value + self.min_value) / 2
+        self._lut = None
+        self._rendered = (None, None)
+
+    def read_region(self, x0, y0, x1, y1, step):
+        """Return samples [y0:y1:step, x0:x1:step] as an array of shape (h, w) or (h, w, c)."""
+        raise NotImplementedError
+
+    def needs_overview(self):
+        """True when the first whole-image read has to decode the full file, see TiffImage."""
+        return False
+
+    def set_window(self, window, level):
+        self.window, self.level = max(window, 1e-6), level
+        self._lut = None
+        self._rendered = (None, None)
+
+    def auto_window(self):
+        # Percentiles of a coarse overview, so the whole image is never read at full resolution
+        import numpy as np
+
+        step = max(1, max(self.width, self.height) // 512)
+        sample = self.read_region(0, 0, self.width, self.height, step)
+        lo, hi = np.percentile(sample, [0.5, 99.5])
+        self.set_window(max(float(hi - lo), 1.0 if self.dtype.kind in "ui" else 1e-6), float(hi + lo) / 2)
+
+    def to_8bit(self, arr):
+        import numpy as np
+
+        low = self.level - self.window / 2
+        if arr.dtype.kind == "u" and arr.dtype.itemsize <= 2:
+            if self._lut is None:
+                values = np.arange(2 ** (8 * arr.dtype.itemsize), dtype=np.float32)
+                self._lut = np.clip((values - low) * (255.0 / self.window), 0, 255).astype(np.uint8)
+            return self._lut[arr]
+        return np.clip((arr.astype(np.float32) - low) * (255.0 / self.window), 0, 255).astype(np.uint8)
+
+    def render(self, x0, y0, x1, y1, step):
+        key = (x0, y0, x1, y1, step)
+        if self._rendered[0] == key:
+            return self._rendered[1]
+        import numpy as np
+
+        arr = self.read_region(x0, y0, x1, y1, step)
+        if arr.ndim == 3:
+            arr = arr[:, :, :3] if arr.shape[2] >= 3 else arr[:, :, 0]
+        out = np.ascontiguousarray(self.to_8bit(arr))
+        h, w = out.shape[:2]
+        if out.ndim == 2:
+            qimage = QImage(out.tobytes(), w, h, w, QImage.Format_Grayscale8).copy()
+        else:
+            qimage = QImage(out.tobytes(), w, h, w * 3, QImage.Format_RGB888).copy()
+        self._rendered = (key, qimage)
+        return qimage
+
+
+class ArrayImage(WindowedImage):
+    """WindowedImage over an (h, w[, c]) array, usually a read-only np.memmap of the file."""
+
+    def __init__(self, array):
+        super().__init__(array.shape[1], array.shape[0], array.dtype)
+        self.array = array
+
+    def read_region(self, x0, y0, x1, y1, step):
+        return self.array[y0:y1:step, x0:x1:step]
+
+
+class TiffImage(WindowedImage):
+    """WindowedImage over a compressed tiled or stripped (Big)TIFF, decoding only the segments a region touches.
+
+    A strip is handled as a tile spanning the full image width. Reduced-resolution
+    pyramid levels are used when zoomed out, and decoded segments are kept in a
+    small LRU cache. Without a pyramid level of at most OVERVIEW_SIZE pixels, an
+    overview is subsampled in one pass the first time the image is seen whole
+    (Auto W/L or fit to window), so those reads don't go through the cache.
+    """
+
+    TILE_CACHE_SIZE = 256
+    OVERVIEW_SIZE = 2048
+
+    def __init__(self, tif, levels):
+        base = levels[0]
+        super().__init__(base.imagewidth, base.imagelength, base.dtype)
+        self.tif = tif
+        self.lock = threading.Lock()
+        # (downsample factor, page) from full resolution to coarsest
+        self.levels = [(base.imagewidth / page.imagewidth, page) for page in levels]
+        from collections import OrderedDict
+        self.tiles = OrderedDict()
+        self.overview = None
+        self.overview_lock = threading.Lock()
+
+    @staticmethod
+    def segment_size(page):
+        if page.is_tiled:
+            return page.tilewidth, page.tilelength
+        return page.imagewidth, min(page.rowsperstrip, page.imagelength)
+
+    def decode_tile(self, page, index):
+        import numpy as np
+
+        with self.lock:
+            fh = self.tif.filehandle
+            fh.seek(page.dataoffsets[index])
+            data = fh.read(page.databytecounts[index])
+        segment, _, shape = page.decode(data, index, jpegtables=page.jpegtables)
+        if segment is None:  # sparse tile
+            segment = np.zeros(shape, dtype=page.dtype)
+        tile = segment.reshape(shape[-3:])  # (length, width, samples); depth is always 1 here
+        if tile.shape[2] == 1:
+            tile = tile[:, :, 0]
+        return tile
+
+    def tile(self, level, page, index):
+        key = (level, index)
+        cached = self.tiles.get(key)
+        if cached is not None:
+            self.tiles.move_to_end(key)
+            return cached
+        tile = self.decode_tile(page, index)
+        self.tiles[key] = tile
+        if len(self.tiles) > self.TILE_CACHE_SIZE:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def needs_overview(self):
+        return self.overview_factor() is not None and self.overview is None
+
+    def overview_factor(self):
+        """Downsample factor of the overview, or None when the coarsest level is small enough already."""
+        factor, page = self.levels[-1]
+        step = -(-max(page.imagewidth, page.imagelength) // self.OVERVIEW_SIZE)
+        return factor * step if step >= 2 else None
+
+    def get_overview(self):
+        factor, page = self.levels[-1]
+        step = int(round(self.overview_factor() / factor))
+        with self.overview_lock:
+            if self.overview is None:
+                t0 = time.perf_counter()
+                array = self.read_level(len(self.levels) - 1, 0, 0, page.imagewidth, page.imagelength,
+                                        step, cached=False)
+                self.overview = (factor * step, array)
+                print(f"[TIFF] Built {array.shape[1]}x{array.shape[0]} overview in "
+                      f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+        return self.overview
+
+    def read_region(self, x0, y0, x1, y1, step):
+        overview_factor = self.overview_factor()
+        if overview_factor is not None and overview_factor <= step:
+            factor, array = self.get_overview()
+            step = max(1, int(step / factor))
+            x0, y0 = int(x0 / factor), int(y0 / factor)
+            x1 = min(array.shape[1], max(x0 + 1, int(x1 / factor)))
+            y1 = min(array.shape[0], max(y0 + 1, int(y1 / factor)))
+            return array[y0:y1:step, x0:x1:step]
+
+        level = 0
+        for i, (factor, _) in enumerate(self.levels):
+            if factor <= step:
+                level = i
+        factor, page = self.levels[level]
+        step = max(1, int(step / factor))
+        x0, y0 = int(x0 / factor), int(y0 / factor)
+        x1 = min(page.imagewidth, max(x0 + 1, int(x1 / factor)))
+        y1 = min(page.imagelength, max(y0 + 1, int(y1 / factor)))
+        return self.read_level(level, x0, y0, x1, y1, step)
+
+    def read_level(self, level, x0, y0, x1, y1, step, cached=True):
+        import numpy as np
+
+        page = self.levels[level][1]
+        tw, th = self.segment_size(page)
+        across = -(-page.imagewidth // tw)
+        out_h, out_w = -(-(y1 - y0) // step), -(-(x1 - x0) // step)
+        samples = page.samplesperpixel
+        out = np.zeros((out_h, out_w, samples) if samples > 1 else (out_h, out_w), dtype=page.dtype)
+        for ty in range(y0 // th, (y1 - 1) // th + 1):
+            # first output row inside this tile, aligned to the global sampling grid
+            ry = y0 + -(-(max(ty * th, y0) - y0) // step) * step
+            ry_end = min((ty + 1) * th, y1)
+            if ry >= ry_end:
+                continue
+            for tx in range(x0 // tw, (x1 - 1) // tw + 1):
+                rx = x0 + -(-(max(tx * tw, x0) - x0) // step) * step
+                rx_end = min((tx + 1) * tw, x1)
+                if rx >= rx_end:
+                    continue
+                index = ty * across + tx
+                tile = self.tile(level, page, index) if cached else self.decode_tile(page, index)
+                block = tile[ry - ty * th:ry_end - ty * th:step, rx - tx * tw:rx_end - tx * tw:step]
+                oy, ox = (ry - y0) // step, (rx - x0) // step
+                out[oy:oy + block.shape[0], ox:ox + block.shape[1]] = block
+        return out
+
+
+HIGH_BIT_DEPTH_MODES = ("I;16", "I;16B", "I;16L", "I", "F")
+
+
+def opens_windowed(path):
+    """True when path is shown through open_windowed_image rather than decoded to an 8-bit pixmap."""
+    lower = path.lower()
+    if lower.endswith(WINDOWED_EXTENSIONS):
+        return True
+    if lower.endswith(".png"):
+        from PIL import Image
+
+        try:
+            with Image.open(path) as img:  # reads the header only
+                return img.mode in HIGH_BIT_DEPTH_MODES
+        except OSError:
+            return False
+    return False
+
+
+def open_windowed_image(path):
+    """Return a WindowedImage for TIFF, raw and high bit depth files, or None for ordinary images."""
+    # numpy is imported per branch: ordinary 8-bit images must keep opening without it
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".raw":
+        import numpy as np
+
+        # Raw frames need a <file>.raw.json sidecar: {"width", "height", "dtype", "channels", "offset"}
+        with open(path + ".json", "r") as f:
+            meta = json.load(f)
+        channels = meta.get("channels", 1)
+        shape = (meta["height"], meta["width"]) + ((channels,) if channels > 1 else ())
+        return ArrayImage(np.memmap(path, dtype=meta.get("dtype", "<u2"), mode="r",
+                                    offset=meta.get("offset", 0), shape=shape))
+    if ext in (".tif", ".tiff"):
+        import numpy as np
+        import tifffile
+
+        tif = tifffile.TiffFile(path)
+        series = tif.series[0]
+        page = series.pages[0]  # a multi-page series is shown by its first page
+        segmented = (page.planarconfig == 1 or page.samplesperpixel == 1) and page.imagedepth == 1
+        if page.is_tiled and segmented:
+            levels = [level.pages[0] for level in series.levels if level.pages[0].is_tiled]
+            return TiffImage(tif, levels)
+        try:
+            array = tifffile.memmap(path, page=page.index, mode="r")  # uncompressed, contiguous data
+        except ValueError:
+            if segmented:  # compressed strips
+                levels = [level.pages[0] for level in series.levels
+                          if not level.pages[0].is_tiled and level.pages[0].imagedepth == 1]
+                return TiffImage(tif, levels)
+            print(f"[TIFF] {os.path.basename(path)}: separate sample planes, decoding the whole image")
+            array = page.asarray()
+        if page.planarconfig == 2 and page.samplesperpixel > 1:
+            array = np.moveaxis(array, 0, -1)  # (samples, h, w) -> (h, w, samples)
+        return ArrayImage(array)
+    if ext == ".png":
+        from PIL import Image
+
+        pil_img = Image.open(path)
+        if pil_img.mode in HIGH_BIT_DEPTH_MODES:
+            import numpy as np
+
+            # PNG rows are one deflate stream, so unlike TIFF this decodes the whole image
+            print(f"[PNG] {os.path.basename(path)}: {pil_img.mode} image, decoding the whole image")
+            array = np.asarray(pil_img)
+            if array.dtype.kind == "i" and array.min() >= 0 and array.max() <= 65535:
+                array = array.astype(np.uint16)  # PIL widens 16-bit PNGs to int32
+            return ArrayImage(array)
+    return None
+
+
+MATCH_IOU = 0.5  # boxes overlapping at least this much are the same object
+SAME_IOU = 0.9   # matched boxes of the same class overlapping less than this count as moved
+
+
+def box_iou_matrix(a, b):
+    """IoU between every box of a (n, 4) and b (m, 4), both YOLO cx, cy, w, h; returns (n, m)."""
+    import numpy as np
+
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    a_lo, a_hi = a[:, None, :2] - a[:, None, 2:] / 2, a[:, None, :2] + a[:, None, 2:] / 2
+    b_lo, b_hi = b[None, :, :2] - b[None, :, 2:] / 2, b[None, :, :2] + b[None, :, 2:] / 2
+    inter = np.clip(np.minimum(a_hi, b_hi) - np.maximum(a_lo, b_lo), 0, None).prod(axis=2)
+    union = a[:, None, 2:].prod(axis=2) + b[None, :, 2:].prod(axis=2) - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+
+
+def match_boxes(rows_a, rows_b, match_iou=MATCH_IOU, method="hungarian"):
+    """Pair boxes of two label sets regardless of class; returns [(i, j, iou), ...].
+
+    "hungarian" maximises total IoU with scipy when it is installed and falls
+    back to "greedy", which takes the highest remaining IoU first.
+    """
+    import numpy as np
+
+    if not rows_a or not rows_b:
+        return []
+    iou = box_iou_matrix([r[1:] for r in rows_a], [r[1:] for r in rows_b])
+    if method == "hungarian":
+        try:
+            from scipy.optimize import linear_sum_assignment
+        except ImportError:
+            method = "greedy"
+        else:
+            ia, ib = linear_sum_assignment(-iou)
+            return [(i, j, float(iou[i, j])) for i, j in zip(ia.tolist(), ib.tolist()) if iou[i, j] >= match_iou]
+    candidates = np.argwhere(iou >= match_iou)
+    order = np.argsort(-iou[candidates[:, 0], candidates[:, 1]], kind="stable")
+    used_a, used_b, pairs = set(), set(), []
+    for i, j in candidates[order].tolist():
+        if i not in used_a and j not in used_b:
+            used_a.add(i)
+            used_b.add(j)
+            pairs.append((i, j, float(iou[i, j])))
+    return pairs
+
+
+def diff_boxes(rows_a, rows_b, match_iou=MATCH_IOU, same_iou=SAME_IOU, method="hungarian"):
+    """Classify the change from label set a to b.
+
+    Returns a dict of index lists: "added" (into b), "removed" (into a) and
+    "unchanged", "moved", "relabelled" as (i, j, iou) pairs.
+    """
+    pairs = match_boxes(rows_a, rows_b, match_iou, method)
+    diff = {"added": [], "removed": [], "unchanged": [], "moved": [], "relabelled": []}
+    for i, j, iou in pairs:
+        if rows_a[i][0] != rows_b[j][0]:
+            diff["relabelled"].append((i, j, iou))
+        elif iou < same_iou:
+            diff["moved"].append((i, j, iou))
+        else:
+            diff["unchanged"].append((i, j, iou))
+    matched_a = {i for i, _, _ in pairs}
+    matched_b = {j for _, j, _ in pairs}
+    diff["removed"] = [i for i in range(len(rows_a)) if i not in matched_a]
+    diff["added"] = [j for j in range(len(rows_b)) if j not in matched_b]
+    return diff
+
+
+def label_stems(*dirs):
+    stems = set()
+    for d in dirs:
+        if d and os.path.isdir(d):
+            stems.update(os.path.splitext(f)[0] for f in os.listdir(d)
+                         if f.endswith(".txt") and f != "classes.txt")
+    return sorted(stems)
+
+
+def _diff_one(task):
+    stem, dir_a, dir_b, match_iou, same_iou, method = task
+    rows_a = read_yolo_txt(os.path.join(dir_a, stem + ".txt"))
+    rows_b = read_yolo_txt(os.path.join(dir_b, stem + ".txt"))
+    diff = diff_boxes(rows_a, rows_b, match_iou, same_iou, method)
+    classes = {}
+    for cls_id, *_ in rows_a:
+        classes.setdefault(cls_id, [0, 0, 0, 0.0])[0] += 1
+    for cls_id, *_ in rows_b:
+        classes.setdefault(cls_id, [0, 0, 0, 0.0])[1] += 1
+    for i, _, iou in diff["unchanged"] + diff["moved"]:
+        stats = classes[rows_a[i][0]]
+        stats[2] += 1
+        stats[3] += float(iou)
+    return stem, {k: len(v) for k, v in diff.items()}, classes
+
+
+def diff_label_dirs(dir_a, dir_b, workers=None, match_iou=MATCH_IOU, same_iou=SAME_IOU, method="hungarian"):
+    """Diff two YOLO label directories image by image across a process pool.
+
+    Returns {"images": {stem: change counts}, "classes": {class_id: agreement metrics}}.
+    Agreement treats a as the reference: a box agrees when it is matched to a
+    box of the same class in b.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    tasks = [(stem, dir_a, dir_b, match_iou, same_iou, method) for stem in label_stems(dir_a, dir_b)]
+    images, totals = {}, {}
+    # spawn: this is usually called from a worker thread of a multi-threaded Qt process, where fork is unsafe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for stem, counts, classes in pool.map(_diff_one, tasks, chunksize=64):
+            images[stem] = counts
+            for cls_id, stats in classes.items():
+                total = totals.setdefault(cls_id, [0, 0, 0, 0.0])
+                for k in range(4):
+                    total[k] += stats[k]
+    metrics = {}
+    for cls_id, (n_a, n_b, agreed, iou_sum) in sorted(totals.items()):
+        metrics[cls_id] = {
+            "n_a": n_a, "n_b": n_b, "agreed": agreed,
+            "precision": agreed / n_b if n_b else 0.0,
+            "recall": agreed / n_a if n_a else 0.0,
+            "f1": 2 * agreed / (n_a + n_b) if n_a + n_b else 0.0,
+            "mean_iou": iou_sum / agreed if agreed else 0.0,
+        }
+    return {"images": images, "classes": metrics}
+
+
+def format_diff_report(report, class_names=()):
+    lines = []
+    totals = {}
+    for counts in report["images"].values():
+        for k, v in counts.items():
+            totals[k] = totals.get(k, 0) + v
+    lines.append(f"{len(report['images'])} images: " + ", ".join(f"{k} {v}" for k, v in totals.items()))
+    lines.append(f"{'class':<28} {'A':>6} {'B':>6} {'agree':>6} {'prec':>6} {'recall':>6} {'F1':>6} {'IoU':>6}")
+    for cls_id, m in report["classes"].items():
+        name = class_names[cls_id] if 0 <= cls_id < len(class_names) else str(cls_id)
+        lines.append(f"{name[:28]:<28} {m['n_a']:>6} {m['n_b']:>6} {m['agreed']:>6} {m['precision']:>6.3f} "
+                     f"{m['recall']:>6.3f} {m['f1']:>6.3f} {m['mean_iou']:>6.3f}")
+    return "\n".join(lines)
+
+
+def format_merge_report(conflicts, out_dir):
+    lines = [f"Merged into {out_dir}: {len(conflicts)} images with conflicts"]
+    for stem, image_conflicts in sorted(conflicts.items()):
+        lines.append(f"{stem}: " + "; ".join(image_conflicts))
+    return "\n".join(lines)
+
+
+def merge_boxes(base, ours, theirs, match_iou=MATCH_IOU, same_iou=SAME_IOU, method="hungarian"):
+    """Three-way merge of one image's label sets; returns (rows, conflicts).
+
+    A change made on only one side is taken. When both sides change the same
+    base box differently ours wins; when one side deletes a box the other
+    changed, the changed box is kept. Both cases are reported as conflicts.
+    """
+    diff_o = diff_boxes(base, ours, match_iou, same_iou, method)
+    diff_t = diff_boxes(base, theirs, match_iou, same_iou, method)
+    map_o = {i: j for key in ("unchanged", "moved", "relabelled") for i, j, _ in diff_o[key]}
+    map_t = {i: j for key in ("unchanged", "moved", "relabelled") for i, j, _ in diff_t[key]}
+    same_o = {i for i, _, _ in diff_o["unchanged"]}
+    same_t = {i for i, _, _ in diff_t["unchanged"]}
+
+    rows, conflicts = [], []
+    for i, row in enumerate(base):
+        jo, jt = map_o.get(i), map_t.get(i)
+        if jo is None and jt is None:
+            continue
+        if jo is None or jt is None:
+            if (jo is not None and i not in same_o) or (jt is not None and i not in same_t):
+                conflicts.append(f"box {i} deleted on one side and changed on the other")
+                rows.append(ours[jo] if jo is not None else theirs[jt])
+            continue  # deleted on one side, untouched on the other
+        if i in same_t:
+            rows.append(ours[jo])
+        elif i in same_o:
+            rows.append(theirs[jt])
+        else:
+            if ours[jo][0] != theirs[jt][0] or box_iou_matrix([ours[jo][1:]], [theirs[jt][1:]])[0, 0] < same_iou:
+                conflicts.append(f"box {i} changed differently on both sides")
+            rows.append(ours[jo])
+
+    added_o = [ours[j] for j in diff_o["added"]]
+    added_t = [theirs[j] for j in diff_t["added"]]
+    rows.extend(added_o)
+    both = diff_boxes(added_o, added_t, match_iou, same_iou, method)
+    for i, j, _ in both["relabelled"]:
+        conflicts.append(f"box added on both sides with classes {added_o[i][0]} and {added_t[j][0]}")
+    rows.extend(added_t[j] for j in both["added"])
+    return rows, conflicts
+
+
+def _merge_one(task):
+    stem, base_dir, ours_dir, theirs_dir, out_dir, match_iou, same_iou, method = task
+    rows, conflicts = merge_boxes(read_yolo_txt(os.path.join(base_dir, stem + ".txt")),
+                                  read_yolo_txt(os.path.join(ours_dir, stem + ".txt")),
+                                  read_yolo_txt(os.path.join(theirs_dir, stem + ".txt")),
+                                  match_iou, same_iou, method)
+    with open(os.path.join(out_dir, stem + ".txt"), "w") as f:
+        for class_id, x, y, ww, hh in rows:
+            f.write(f"{int(class_id)} {x:.6f} {y:.6f} {ww:.6f} {hh:.6f}\n")
+    return stem, conflicts
+
+
+def merge_label_dirs(base_dir, ours_dir, theirs_dir, out_dir, workers=None,
+                     match_iou=MATCH_IOU, same_iou=SAME_IOU, method="hungarian"):
+    """Three-way merge of YOLO label directories into out_dir; returns {stem: [conflicts]}."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    os.makedirs(out_dir, exist_ok=True)
+    classes_path = os.path.join(ours_dir, "classes.txt")
+    if os.path.exists(classes_path):
+        import shutil
+        shutil.copyfile(classes_path, os.path.join(out_dir, "classes.txt"))
+    tasks = [(stem, base_dir, ours_dir, theirs_dir, out_dir, match_iou, same_iou, method)
+             for stem in label_stems(base_dir, ours_dir, theirs_dir)]
+    conflicts = {}
+    # spawn: this is usually called from a worker thread of a multi-threaded Qt process, where fork is unsafe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for stem, image_conflicts in pool.map(_merge_one, tasks, chunksize=64):
+            if image_conflicts:
+                conflicts[stem] = image_conflicts
+    print(f"[MERGE] {len(tasks)} label files merged into {out_dir}, {len(conflicts)} with conflicts")
+    return conflicts
+
+
+class BoxList(list):
+    """The (QRectF, label) boxes of an image; version counts mutations so derived arrays can be cached.
+
+    Boxes are replaced, never edited in place, so list mutations are the only changes.
+    """
+
+    version = 0
+
+    def __setitem__(self, index, value):
+        self.version += 1
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index):
+        self.version += 1
+        super().__delitem__(index)
+
+    def __iadd__(self, other):
+        self.version += 1
+        return super().__iadd__(other)
+
+    def append(self, item):
+        self.version += 1
+        super().append(item)
+
+    def extend(self, items):
+        self.version += 1
+        super().extend(items)
+
+    def insert(self, index, item):
+        self.version += 1
+        super().insert(index, item)
+
+    def pop(self, index=-1):
+        self.version += 1
+        return super().pop(index)
+
+    def remove(self, item):
+        self.version += 1
+        super().remove(item)
+
+    def clear(self):
+        self.version += 1
+        super().clear()
+
+
+class OverlayRenderer:
+    """Draws the bounding-box overlay for ZoomableLabel.
+
+    Pens and laid-out label text are cached per class, and box extents are kept
+    in a numpy array rebuilt only when the boxes change, so finding the visible
+    boxes is one vectorised test and the per-box work grows with what is on
+    screen. Boxes too small to read lose their label, and tiny boxes collapse
+    to a single point.
+    """
+
+    MIN_BOX_PX = 4     # boxes smaller than this on screen are drawn as a point
+    MIN_LABEL_PX = 16  # boxes smaller than this on screen are drawn without label text
+
+    def __init__(self):
+        self.hover_pen = QPen(QColor(255, 255, 0), 2, Qt.DashLine)
+        self.selected_pen = QPen(QColor(0, 255, 255), 2)
+        self.diff_pens = {
+            "added": QPen(QColor(0, 200, 0), 2, Qt.DashLine),
+            "removed": QPen(QColor(255, 0, 0), 2, Qt.DotLine),
+            "moved": QPen(QColor(255, 140, 0), 2, Qt.DashLine),
+            "relabelled": QPen(QColor(255, 0, 255), 2, Qt.DashLine),
+        }
+        self.pens = {}
+        self.texts = {}
+        self.extents = None  # (n, 4) x0, y0, x1, y1 of the boxes in image pixels
+        self.extents_of = (None, None)  # (BoxList, version) the extents were built from
+
+    def set_classes(self, class_names):
+        self.pens = {}
+        for name in class_names:
+            self.pen_for(name)
+
+    def pen_for(self, label):
+        pen = self.pens.get(label)
+        if pen is None:
+            # Golden-angle hue steps keep neighbouring class ids visually distinct
+            pen = QPen(QColor.fromHsv(len(self.pens) * 137 % 360, 255, 255), 2)
+            self.pens[label] = pen
+        return pen
+
+    def text_for(self, label, painter):
+        cached = self.texts.get(label)
+        if cached is None:
+            text = QStaticText(label)
+            text.setPerformanceHint(QStaticText.AggressiveCaching)
+            # drawText placed the baseline 4px above the box; static text is positioned by its top
+            cached = (text, QPointF(2, -4 - painter.fontMetrics().ascent()))
+            self.texts[label] = cached
+        return cached
+
+    def visible_boxes(self, rects, scale, visible, label_height):
+        """Yield (index, x, y, w, h) in screen pixels for boxes whose outline or label reaches visible."""
+        # The label sits above its box, so a box starting just below the area can still show its label
+        left, top = visible.left() / scale, visible.top() / scale
+        right, bottom = visible.right() / scale, (visible.bottom() + label_height) / scale
+        try:
+            import numpy as np
+        except ImportError:
+            for i, (rect, _) in enumerate(rects):
+                x, y, w, h = rect.x(), rect.y(), rect.width(), rect.height()
+                if not (x > right or y > bottom or x + w < left or y + h < top):
+                    yield i, x * scale, y * scale, w * scale, h * scale
+            return
+
+        version = getattr(rects, "version", None)
+        if self.extents_of[0] is not rects or self.extents_of[1] != version or version is None:
+            self.extents = np.array([(r.x(), r.y(), r.x() + r.width(), r.y() + r.height()) for r, _ in rects],
+                                    dtype=np.float64).reshape(-1, 4)
+            self.extents_of = (rects, version)
+        e = self.extents
+        hits = np.flatnonzero((e[:, 0] <= right) & (e[:, 1] <= bottom) & (e[:, 2] >= left) & (e[:, 3] >= top))
+        for i, (x0, y0, x1, y1) in zip(hits.tolist(), (e[hits] * scale).tolist()):
+            yield i, x0, y0, x1 - x0, y1 - y0
+
+    def paint(self, painter, rects, scale, visible, hover_index=-1, selected_index=-1):
+        boxes, points, labels = {}, {}, {}
+        label_height = painter.fontMetrics().height() + 4
+        for i, x, y, w, h in self.visible_boxes(rects, scale, visible, label_height):
+            label = rects[i][1]
+            if i == hover_index:
+                pen = self.hover_pen
+            elif i == selected_index:
+                pen = self.selected_pen
+            else:
+                pen = self.pen_for(label)
+            key = id(pen)
+            if w < self.MIN_BOX_PX and h < self.MIN_BOX_PX:
+                points.setdefault(key, (pen, []))[1].append(QPointF(x + w / 2, y + h / 2))
+                continue
+            boxes.setdefault(key, (pen, []))[1].append(QRectF(x, y, w, h))
+            if w >= self.MIN_LABEL_PX and h >= self.MIN_LABEL_PX:
+                labels.setdefault(key, (pen, []))[1].append((QPointF(x, y), label))
+
+        for pen, batch in boxes.values():
+            painter.setPen(pen)
+            painter.drawRects(batch)
+        for pen, batch in points.values():
+            painter.setPen(pen)
+            painter.drawPoints(QPolygonF(batch))
+        for pen, batch in labels.values():
+            painter.setPen(pen)
+            for pos, label in batch:
+                text, offset = self.text_for(label, painter)
+                painter.drawStaticText(pos + offset, text)
+
+    def paint_diff(self, painter, diff_rects, scale, visible):
+        """Draw (rect, text, category) entries of a label diff over the image."""
+        for rect, text, category in diff_rects:
+            scaled = QRectF(rect.x() * scale, rect.y() * scale, rect.width() * scale, rect.height() * scale)
+            if not scaled.intersects(visible):
+                continue
+            painter.setPen(self.diff_pens[category])
+            painter.drawRect(scaled)
+            if scaled.width() >= self.MIN_LABEL_PX and scaled.height() >= self.MIN_LABEL_PX:
+                static_text, offset = self.text_for(text, painter)
+                # below the box, so it does not collide with the label of the box being compared
+                painter.drawStaticText(scaled.bottomLeft() + QPointF(2, 2), static_text)
+
+
+class ThroughputStats:
+    """Counts labelling actions and per-image dwell time for the current session.
+
+    One JSON line per visited image is appended to THROUGHPUT_LOG_PATH, tagged
+    with the mode it was labelled in, so fast and dialog-driven sessions can be
+    compared afterwards. Action counts, time and dwell times are kept per mode.
+    """
+
+    def __init__(self, log_path=THROUGHPUT_LOG_PATH):
+        self.log_path = log_path
+        self.mode = "normal"
+        self.mode_start = time.perf_counter()
+        self.mode_seconds = {}  # mode -> time spent in it before the current stretch
+        self.actions = {}       # mode -> action count
+        self.dwell_times = {}   # mode -> [seconds per visited image]
+        self.image = None
+        self.image_start = None
+        self.image_actions = {}
+
+    def record(self, action):
+        self.actions[self.mode] = self.actions.get(self.mode, 0) + 1
+        self.image_actions[action] = self.image_actions.get(action, 0) + 1
+
+    def set_mode(self, mode):
+        # Close the current image under the old mode so its dwell time is not credited to the new one
+        if mode == self.mode:
+            return
+        image = self.image
+        self.leave_image()
+        now = time.perf_counter()
+        self.mode_seconds[self.mode] = self.mode_seconds.get(self.mode, 0.0) + now - self.mode_start
+        self.mode, self.mode_start = mode, now
+        if image is not None:
+            self.enter_image(image)
+
+    def enter_image(self, image):
+        self.leave_image()
+        self.image = image
+        self.image_start = time.perf_counter()
+        self.image_actions = {}
+
+    def leave_image(self):
+        if self.image is None:
+            return
+        dwell = time.perf_counter() - self.image_start
+        self.dwell_times.setdefault(self.mode, []).append(dwell)
+        try:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps({"image": self.image, "mode": self.mode, "dwell_s": round(dwell, 3),
+                                    "actions": self.image_actions, "time": time.time()}) + "\n")
+        except Exception as e:
+            print("Failed to write throughput log:", e)
+        self.image = None
+
+    def actions_per_minute(self, mode=None):
+        mode = mode or self.mode
+        seconds = self.mode_seconds.get(mode, 0.0)
+        if mode == self.mode:
+            seconds += time.perf_counter() - self.mode_start
+        return self.actions.get(mode, 0) / (seconds / 60) if seconds > 0 else 0.0
+
+    def summary(self):
+        dwell_times = self.dwell_times.get(self.mode, [])
+        avg_dwell = sum(dwell_times) / len(dwell_times) if dwell_times else 0.0
+        return (f"{self.mode} APM: {self.actions_per_minute():.1f} | avg dwell: {avg_dwell:.1f}s"
+                f" | images: {len(dwell_times)}")
+
+
 class ZoomableLabel(QLabel):
     def __init__(self, viewer):
         super().__init__()
         self.setMouseTracking(True)
         self.pix = None
-        self.rects = []
+        self.source = None  # WindowedImage drawn region by region instead of a full pixmap
+        self.placeholder = None  # text shown while there is no image yet
+        self.rects = BoxList()
+        self.diff_rects = []  # (rect, text, category) from comparing against another label set
         self.start_point = None
         self.end_point = None
         self.drawing = False
@@ -67,11 +1236,50 @@ class ZoomableLabel(QLabel):
         self.pan_offset = QPoint(0, 0)
         self.last_pan_pos = QPoint()
 
+        self.overlay = OverlayRenderer()
+
+    def notify_change(self, action):
+        if hasattr(self, 'rects_changed'):
+            self.rects_changed()
+        if hasattr(self.viewer, 'record_action'):
+            self.viewer.record_action(action)
+
     def setPixmap(self, pix):
+        if pix is None or pix.isNull():
+            self.clear_image()
+            return
         self.pix = pix
+        self.source = None
+        self.placeholder = None
         self.scale_factor = min(self.width() / pix.width(), self.height() / pix.height())
         self.update()
 
+    def set_source(self, source):
+        if source is None or not source.width or not source.height:
+            self.clear_image()
+            return
+        self.pix = None
+        self.source = source
+        self.placeholder = None
+        self.scale_factor = min(self.width() / source.width, self.height() / source.height)
+        self.update()
+
+    def clear_image(self):
+        # Nothing to show, e.g. after a failed decode; paint and resize skip an empty label
+        self.pix = None
+        self.source = None
+        self.placeholder = None
+        self.update()
+
+    def show_placeholder(self, text):
+        self.clear_image()
+        self.placeholder = text
+
+    def image_dims(self):
+        if self.source is not None:
+            return self.source.width, self.source.height
+        return self.pix.width(), self.pix.height()
+
     def start_drawing(self, callback):
         self.drawing = True
         self.callback = callback
@@ -159,6 +1367,7 @@ class ZoomableLabel(QLabel):
                         if action == delete_action:
                             del self.rects[i]
                             self.selected_index = -1
+                            self.notify_change("delete")
                             self.update()
                             return
 
@@ -188,6 +1397,7 @@ class ZoomableLabel(QLabel):
                                     self.viewer.class_names.append(new_label)
                                     self.viewer.class_list_widget.addItem(new_label)
                                 self.rects[i] = (rect, new_label)
+                                self.notify_change("relabel")
                                 self.update()
                             return
 
@@ -223,6 +1433,7 @@ class ZoomableLabel(QLabel):
         # Handle dragging (e.g., moving an existing rectangle in edit mode)
         if self.dragging:
             self.dragging = False
+            self.notify_change("move")
             return
 
         # Handle drawing (finalize a new rectangle in create mode)
@@ -246,7 +1457,9 @@ class ZoomableLabel(QLabel):
             self.panning = False
 
     def paintEvent(self, event):
-        if not self.pix:
+        if self.pix is None and self.source is None:
+            if self.placeholder:
+                QPainter(self).drawText(self.rect(), Qt.AlignCenter, self.placeholder)
             return
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
@@ -255,26 +1468,19 @@ class ZoomableLabel(QLabel):
         painter.translate(-self.pan_offset.x(), -self.pan_offset.y())
 
         # Draw the image
-        scaled_w = int(self.pix.width() * self.scale_factor)
-        scaled_h = int(self.pix.height() * self.scale_factor)
-        painter.drawPixmap(0, 0, scaled_w, scaled_h, self.pix)
-
-        # Draw existing bounding boxes
-        for i, (rect, label) in enumerate(self.rects):
-            if i == self.hover_index:
-                painter.setPen(QPen(QColor(255, 255, 0), 2, Qt.DashLine))
-            elif i == self.selected_index:
-                painter.setPen(QPen(QColor(0, 255, 255), 2))
-            else:
-                painter.setPen(QPen(QColor(255, 0, 0), 2))
-            scaled_rect = QRectF(
-                rect.x() * self.scale_factor,
-                rect.y() * self.scale_factor,
-                rect.width() * self.scale_factor,
-                rect.height() * self.scale_factor
-            )
-            painter.drawRect(scaled_rect)
-            painter.drawText(scaled_rect.topLeft() + QPointF(2, -4), label)
+        if self.source is not None:
+            self.paint_source(painter, event.rect())
+        else:
+            scaled_w = int(self.pix.width() * self.scale_factor)
+            scaled_h = int(self.pix.height() * self.scale_factor)
+            painter.drawPixmap(0, 0, scaled_w, scaled_h, self.pix)
+
+        # Draw existing bounding boxes, only those inside the repainted area
+        visible = QRectF(event.rect()).translated(self.pan_offset.x(), self.pan_offset.y())
+        self.overlay.paint(painter, self.rects, self.scale_factor, visible,
+                           self.hover_index, self.selected_index)
+        if self.diff_rects:
+            self.overlay.paint_diff(painter, self.diff_rects, self.scale_factor, visible)
 
         # Draw temporary rectangle during drawing mode
         if self.drawing and self.start_point and self.end_point:
@@ -293,6 +1499,23 @@ class ZoomableLabel(QLabel):
             ).normalized()
             painter.drawRect(temp_rect)
 
+    def paint_source(self, painter, widget_rect):
+        # Only the part of the image under the repainted area is read, subsampled to screen resolution
+        s = self.scale_factor
+        x0 = max(0, int((widget_rect.left() + self.pan_offset.x()) / s))
+        y0 = max(0, int((widget_rect.top() + self.pan_offset.y()) / s))
+        x1 = min(self.source.width, int((widget_rect.right() + 1 + self.pan_offset.x()) / s) + 1)
+        y1 = min(self.source.height, int((widget_rect.bottom() + 1 + self.pan_offset.y()) / s) + 1)
+        if x1 <= x0 or y1 <= y0:
+            return
+        step = max(1, int(1 / s))
+        try:
+            region = self.source.render(x0, y0, x1, y1, step)
+        except Exception as e:
+            print(f"Failed to read image region: {e}")
+            return
+        painter.drawImage(QRectF(x0 * s, y0 * s, (x1 - x0) * s, (y1 - y0) * s), region)
+
     def wheelEvent(self, event):
         delta = event.angleDelta().y()
         if delta > 0:
@@ -302,11 +1525,12 @@ class ZoomableLabel(QLabel):
         self.update()
 
     def resizeEvent(self, event):
-        if not self.pix:
+        if self.pix is None and self.source is None:
             return
+        image_w, image_h = self.image_dims()
         self.scale_factor = min(
-            self.width() / self.pix.width(),
-            self.height() / self.pix.height()
+            self.width() / image_w,
+            self.height() / image_h
         )
         self.update()
 
@@ -406,7 +1630,7 @@ class ZoomableLabel(QLabel):
         self.needs_save = True
 
     def load_last_path(self):
-        config_path = "config_path.json"
+        config_path = CONFIG_PATH
         if os.path.exists(config_path):
             try:
                 with open(config_path, "r") as f:
@@ -423,9 +1647,13 @@ class ZoomableLabel(QLabel):
 
 
 class JSONViewer(QMainWindow):
+    # (callback, future) of a finished worker-pool task, delivered on the GUI thread
+    background_done = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Labelimg Yolo Editor")
+        self.background_done.connect(self.on_background_done)
 
         self.class_names = []
         self.image_files = []
@@ -433,6 +1661,19 @@ class JSONViewer(QMainWindow):
         self.needs_save = False
         self.last_open_dir = self.load_last_path()
         self.in_search_mode = False  # Flag for search mode
+        self.shard = None  # LabelShard when a packed shard is open instead of a folder
+        self.video = None  # VideoSequence when a video is open as an image sequence
+        self.compare_dir = None  # label directory diffed against the current labels
+        self.pending_source = None  # WindowedImage whose overview is still being built
+        self.image_size = None  # (w, h) of the displayed image, used to normalize boxes on save
+
+        # Fast mode: sticky class instead of the label dialog, silent autosave, single-key navigation
+        self.fast_mode = False
+        self.sticky_class = 0
+        self.stats = ThroughputStats()
+        self.prefetch_pool = None
+        self.job_pool_executor = None  # folder-wide jobs, kept off the image decode pool
+        self.prefetched = {}  # image path -> Future of its decoded QImage
 
         # 总体布局
         self.splitter = QSplitter()
@@ -449,6 +1690,7 @@ class JSONViewer(QMainWindow):
         self.tab1 = QWidget()
         self.tab1_layout = QVBoxLayout()
         self.tab1.setLayout(self.tab1_layout)
+        self.tab1_built = False  # Record Viewer contents are built on first use
         self.tab_widget.addTab(self.tab1, "Record Viewer")
 
         self.tab2 = QWidget()
@@ -456,18 +1698,6 @@ class JSONViewer(QMainWindow):
         self.tab2.setLayout(self.tab2_layout)
         self.tab_widget.addTab(self.tab2, "BBox Editor")
 
-        for i in range(6):
-            label = QLabel(f"field{i + 1}")
-            field = QTextEdit()
-            hbox = QHBoxLayout()
-            hbox.addWidget(label)
-            hbox.addWidget(field)
-            self.tab1_layout.addLayout(hbox)
-
-        self.tab1_layout.addWidget(QPushButton("PREV rec"))
-        self.tab1_layout.addWidget(QPushButton("NEXT rec"))
-        self.tab1_layout.addWidget(QPushButton("Save All recs"))
-
         self.class_list_widget = QListWidget()
         self.tab2_layout.addWidget(QLabel("Class List"))
         self.tab2_layout.addWidget(self.class_list_widget)
@@ -481,9 +1711,46 @@ class JSONViewer(QMainWindow):
         self.btn_save = QPushButton("Save YOLO", self)
         self.btn_save.clicked.connect(self.save_annotations)
 
+        self.btn_fast = QPushButton("Fast Mode", self)
+        self.btn_fast.setCheckable(True)
+        self.btn_fast.toggled.connect(self.toggle_fast_mode)
+        self.btn_fast.setToolTip("1-9/0 or [ ] pick the class, A/D or arrows move between images, "
+                                 "Backspace removes the last box. Saves without asking.")
+        self.btn_export_frames = QPushButton("Export Video Frames", self)
+        self.btn_export_frames.clicked.connect(self.export_video_frames)
+        self.sticky_class_label = QLabel("Class: --")
+        self.stats_label = QLabel(self.stats.summary())
+
         self.tab2_layout.addWidget(self.btn_create)
         self.tab2_layout.addWidget(self.btn_edit)
         self.tab2_layout.addWidget(self.btn_save)
+        self.tab2_layout.addWidget(self.btn_fast)
+        self.tab2_layout.addWidget(self.btn_export_frames)
+
+        self.btn_compare = QPushButton("Compare Labels", self)
+        self.btn_compare.clicked.connect(self.select_compare_dir)
+        self.btn_merge = QPushButton("3-way Merge", self)
+        self.btn_merge.clicked.connect(self.merge_labels)
+        self.tab2_layout.addWidget(self.btn_compare)
+        self.tab2_layout.addWidget(self.btn_merge)
+        self.tab2_layout.addWidget(self.sticky_class_label)
+        self.tab2_layout.addWidget(self.stats_label)
+
+        # Window/level for 16-bit and float images, applied while drawing the visible region
+        self.window_spin = QSpinBox()
+        self.level_spin = QSpinBox()
+        self.btn_auto_window = QPushButton("Auto W/L")
+        self.btn_auto_window.clicked.connect(self.auto_window_level)
+        window_level_box = QHBoxLayout()
+        window_level_box.addWidget(QLabel("Window"))
+        window_level_box.addWidget(self.window_spin)
+        window_level_box.addWidget(QLabel("Level"))
+        window_level_box.addWidget(self.level_spin)
+        window_level_box.addWidget(self.btn_auto_window)
+        self.tab2_layout.addLayout(window_level_box)
+        self.window_spin.valueChanged.connect(self.apply_window_level)
+        self.level_spin.valueChanged.connect(self.apply_window_level)
+        self.set_window_level_enabled(False)
 
         self.right_panel = QWidget()
         self.right_layout = QVBoxLayout()
@@ -493,6 +1760,12 @@ class JSONViewer(QMainWindow):
         top_bar = QHBoxLayout()
         self.btn_folder = QPushButton("Image Folder")
         self.btn_folder.clicked.connect(self.select_folder)
+        self.btn_open_shard = QPushButton("Open Shard")
+        self.btn_open_shard.clicked.connect(self.select_shard)
+        self.btn_export_shard = QPushButton("Export Shard")
+        self.btn_export_shard.clicked.connect(self.export_shard)
+        self.btn_open_video = QPushButton("Open Video")
+        self.btn_open_video.clicked.connect(self.select_video)
         self.txt_name = QLineEdit()
         self.txt_name.setEnabled(True)
         self.txt_name.returnPressed.connect(self.search_image_by_name)
@@ -505,6 +1778,9 @@ class JSONViewer(QMainWindow):
         self.btn_prev = QPushButton("PREV IMAGE")
         self.btn_next = QPushButton("NEXT IMAGE")
         top_bar.addWidget(self.btn_folder)
+        top_bar.addWidget(self.btn_open_shard)
+        top_bar.addWidget(self.btn_export_shard)
+        top_bar.addWidget(self.btn_open_video)
         top_bar.addWidget(self.txt_name)
         top_bar.addWidget(self.resolution_label)  # Add resolution label to top bar
         top_bar.addWidget(self.btn_prev)
@@ -515,6 +1791,7 @@ class JSONViewer(QMainWindow):
         self.image_display = ZoomableLabel(self)
         self.image_display.setStyleSheet("background: #ddd")
         self.image_display.setMinimumSize(1000, 750)  # kua3--Change image display size:
+        self.image_display.setFocusPolicy(Qt.StrongFocus)  # unhandled keys reach keyPressEvent below
         self.image_display.callback = self.on_rect_created
         self.right_layout.addWidget(self.image_display)
 
@@ -544,8 +1821,30 @@ class JSONViewer(QMainWindow):
 
         self.set_mode('')
         self.setMinimumSize(1300, 1000)
+
+        # Open on the editor tab; the Record Viewer is only built if the user switches to it
+        self.tab_widget.setCurrentWidget(self.tab2)
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
         print("Window initialized, ready for interaction")
 
+    def on_tab_changed(self, index):
+        if self.tab_widget.widget(index) is self.tab1 and not self.tab1_built:
+            self.build_record_viewer_tab()
+
+    def build_record_viewer_tab(self):
+        for i in range(6):
+            label = QLabel(f"field{i + 1}")
+            field = QTextEdit()
+            hbox = QHBoxLayout()
+            hbox.addWidget(label)
+            hbox.addWidget(field)
+            self.tab1_layout.addLayout(hbox)
+
+        self.tab1_layout.addWidget(QPushButton("PREV rec"))
+        self.tab1_layout.addWidget(QPushButton("NEXT rec"))
+        self.tab1_layout.addWidget(QPushButton("Save All recs"))
+        self.tab1_built = True
+
     def on_textbox_focus(self, event):
         self.in_search_mode = True
         print("Entered search mode")
@@ -622,48 +1921,351 @@ class JSONViewer(QMainWindow):
 
     def on_rect_created(self, rect):
         if hasattr(self, 'class_names'):
-            label, ok = QInputDialog.getItem(self, "Select Label", "Class:", self.class_names, 0, False)
+            label, ok = self.choose_label()
             if ok:
                 self.image_display.rects.append((rect, label))
                 self.image_display.update()
+                self.record_action("create")
         else:
             self.image_display.rects.append((rect, "unlabeled"))
             self.image_display.update()
         self.needs_save = True
 
-    def load_last_path(self):
-        config_path = "config_path.json"
-        if os.path.exists(config_path):
+    def choose_label(self):
+        if self.fast_mode and self.class_names:
+            return self.class_names[min(self.sticky_class, len(self.class_names) - 1)], True
+        return QInputDialog.getItem(self, "Select Label", "Class:", self.class_names, 0, False)
+
+    def toggle_fast_mode(self, checked):
+        self.fast_mode = checked
+        self.stats.set_mode("fast" if checked else "normal")
+        if checked:
+            self.enter_create_mode()
+            self.image_display.edit_mode = False
+            self.btn_create.setText("Creating ON")
+            self.btn_create.setStyleSheet("background-color: lightgreen;")
+            self.btn_edit.setText("Edit")
+            self.btn_edit.setStyleSheet("")
+            self.image_display.setFocus()
+        self.update_fast_status()
+
+    def set_editing_enabled(self, enabled):
+        # Shards are read-only: switch off every way of changing boxes instead of dropping edits on save
+        if not enabled:
+            self.btn_fast.setChecked(False)
+            self.image_display.selected_index = -1
+            self.btn_create.setText("Create")
+            self.btn_edit.setText("Edit")
+            self.set_mode('')
+        for button in (self.btn_create, self.btn_edit, self.btn_save, self.btn_fast):
+            button.setEnabled(enabled)
+
+    def set_sticky_class(self, index):
+        if 0 <= index < len(self.class_names):
+            self.sticky_class = index
+            self.record_action("class")
+
+    def update_fast_status(self):
+        if self.class_names:
+            index = min(self.sticky_class, len(self.class_names) - 1)
+            self.sticky_class_label.setText(f"Class: [{index + 1}] {self.class_names[index]}")
+        self.stats_label.setText(self.stats.summary())
+
+    def record_action(self, action):
+        self.stats.record(action)
+        self.update_fast_status()
+
+    def keyPressEvent(self, event):
+        if not self.fast_mode:
+            super().keyPressEvent(event)
+            return
+        key = event.key()
+        count = len(self.class_names)
+        if Qt.Key_0 <= key <= Qt.Key_9:
+            self.set_sticky_class((key - Qt.Key_1) % 10)  # 1..9 -> classes 1-9, 0 -> class 10
+        elif key == Qt.Key_BracketRight and count:
+            self.set_sticky_class((self.sticky_class + 1) % count)
+        elif key == Qt.Key_BracketLeft and count:
+            self.set_sticky_class((self.sticky_class - 1) % count)
+        elif key in (Qt.Key_D, Qt.Key_Right):
+            self.next_image()
+        elif key in (Qt.Key_A, Qt.Key_Left):
+            self.prev_image()
+        elif key == Qt.Key_Backspace and self.image_display.rects:
+            self.image_display.rects.pop()
+            self.image_display.update()
+            self.needs_save = True
+            self.record_action("delete")
+        else:
+            super().keyPressEvent(event)
+
+    def closeEvent(self, event):
+        self.stats.leave_image()
+        if self.shard is None and self.video is None and self.image_files:
+            self.save_folder_index()  # remember where the user left off
+        for pool in (self.prefetch_pool, self.job_pool_executor):
+            if pool is not None:
+                pool.shutdown(wait=False)
+        super().closeEvent(event)
+
+    def load_config(self):
+        if os.path.exists(CONFIG_PATH):
             try:
-                with open(config_path, "r") as f:
-                    return json.load(f).get("last_open_dir", os.getcwd())
+                with open(CONFIG_PATH, "r") as f:
+                    return json.load(f)
             except Exception as e:
                 print("读取配置失败:", e)
-        return os.getcwd()
+        return {}
+
+    def load_last_path(self):
+        return self.load_config().get("last_open_dir", os.getcwd())
 
     def load_class_list(self, path):
         if os.path.exists(path):
             with open(path, "r") as f:
                 self.class_names = [line.strip() for line in f if line.strip()]
                 self.class_list_widget.addItems(self.class_names)
+        self.image_display.overlay.set_classes(self.class_names)
 
     def select_folder(self):
         print("select_folder called")
         folder = QFileDialog.getExistingDirectory(self, "Select Folder", self.last_open_dir)
         if folder:
-            self.last_open_dir = folder
-            self.image_files = [os.path.join(folder, f) for f in os.listdir(folder)
-                                if f.lower().endswith((".png", ".jpg", ".jpeg"))]
-            classes_path = os.path.join(self.last_open_dir, "classes.txt")
-            self.load_class_list(classes_path)
-            self.image_files.sort()
-            self.current_index = 0
+            self.open_folder(folder)
+
+    def scan_folder(self, folder):
+        return [os.path.join(folder, f) for f in list_images(folder)]
+
+    def open_folder(self, folder, image_files=None, index=0):
+        self.shard = None
+        self.video = None
+        self.set_editing_enabled(True)
+        self.last_open_dir = folder
+        if image_files is None:
+            image_files = self.scan_folder(folder)
+            self.save_image_list(folder, image_files)
+        self.image_files = image_files
+        classes_path = os.path.join(self.last_open_dir, "classes.txt")
+        self.load_class_list(classes_path)
+        self.current_index = index if 0 <= index < len(self.image_files) else 0
+        self.load_image()
+        self.save_folder_index()
+
+    def select_shard(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open Label Shard", self.last_open_dir,
+                                              f"Label shards (*{SHARD_EXTENSION})")
+        if path:
+            self.open_shard(path)
+
+    def open_shard(self, path):
+        try:
+            shard = LabelShard(path)
+        except Exception as e:
+            QMessageBox.warning(self, "Open Shard", f"Failed to open {path}: {e}")
+            return
+        self.shard = shard
+        self.video = None
+        self.set_editing_enabled(False)
+        self.needs_save = False
+        self.class_names = list(shard.class_names)
+        self.class_list_widget.clear()
+        self.class_list_widget.addItems(self.class_names)
+        self.image_display.overlay.set_classes(self.class_names)
+        self.image_files = [shard.image_path(i) for i in range(len(shard))]
+        self.current_index = 0
+        self.load_image()
+
+    def select_video(self):
+        extensions = " ".join(f"*{ext}" for ext in VIDEO_EXTENSIONS)
+        path, _ = QFileDialog.getOpenFileName(self, "Open Video", self.last_open_dir,
+                                              f"Videos ({extensions})")
+        if path:
+            self.open_video(path)
+
+    def open_video(self, path):
+        # Building the seek index demuxes the whole file, so the video is opened on the job pool
+        self.btn_open_video.setEnabled(False)
+        self.info_textbox.append(f"Indexing {path}...")
+        self.run_in_background(VideoSequence, path, on_done=lambda f: self.on_video_opened(path, f),
+                               pool=self.job_pool())
+
+    def on_video_opened(self, path, future):
+        self.btn_open_video.setEnabled(True)
+        try:
+            video = future.result()
+        except Exception as e:
+            QMessageBox.warning(self, "Open Video", f"Failed to open {path}: {e}")
+            return
+        self.shard = None
+        self.video = video
+        self.set_editing_enabled(True)
+        self.last_open_dir = os.path.dirname(path)
+        self.class_names = []
+        self.class_list_widget.clear()
+        self.load_class_list(os.path.join(self.last_open_dir, "classes.txt"))
+        self.image_files = [video.frame_name(i) for i in range(len(video))]
+        self.current_index = 0
+        self.load_image()
+
+    def export_video_frames(self):
+        if self.video is None:
+            QMessageBox.warning(self, "Export Frames", "Open a video first.")
+            return
+        if self.needs_save:
+            self.save_yolo_format()
+        keys = sorted(self.video.keyframes)
+        default = f"{keys[0]}-{keys[-1]}:10" if keys else f"0-{len(self.video) - 1}:30"
+        spec, ok = QInputDialog.getText(self, "Export Frames",
+                                        "Frames to export (e.g. 0-300:10, 512):", QLineEdit.Normal, default)
+        if not ok or not spec.strip():
+            return
+        try:
+            frames = parse_frame_spec(spec, len(self.video))
+        except ValueError:
+            QMessageBox.warning(self, "Export Frames", f"Invalid frame selection: {spec}")
+            return
+        out_dir = QFileDialog.getExistingDirectory(self, "Export Frames To", self.last_open_dir)
+        if not out_dir:
+            return
+        # Decoding runs on the job pool; the window stays responsive while frames are written
+        self.btn_export_frames.setEnabled(False)
+        self.info_textbox.append(f"Exporting {len(frames)} frames to {out_dir} in the background...")
+        self.run_in_background(self.video.export_frames, frames, out_dir, list(self.class_names),
+                               on_done=lambda f: self.on_frames_exported(out_dir, f), pool=self.job_pool())
+
+    def on_frames_exported(self, out_dir, future):
+        self.btn_export_frames.setEnabled(True)
+        try:
+            count = future.result()
+        except Exception as e:
+            QMessageBox.warning(self, "Export Frames", f"Export failed: {e}")
+            return
+        self.info_textbox.append(f"Exported {count} frames to {out_dir}")
+
+    def export_shard(self):
+        if self.shard is not None or self.video is not None or not self.image_files:
+            QMessageBox.warning(self, "Export Shard", "Open an image folder first.")
+            return
+        default = os.path.join(self.last_open_dir, os.path.basename(self.last_open_dir) + SHARD_EXTENSION)
+        out_path, _ = QFileDialog.getSaveFileName(self, "Export Label Shard", default,
+                                                  f"Label shards (*{SHARD_EXTENSION})")
+        if not out_path:
+            return
+        include_images = QMessageBox.question(
+            self, "Export Shard", "Also pack the image files into shards?",
+            QMessageBox.Yes | QMessageBox.No
+        ) == QMessageBox.Yes
+        if self.needs_save:
+            self.save_yolo_format()
+        # Packing can mean gigabytes of image bytes, so it runs on the job pool
+        self.btn_export_shard.setEnabled(False)
+        self.info_textbox.append(f"Exporting shard to {out_path} in the background...")
+        self.run_in_background(export_label_shard, self.last_open_dir, out_path, include_images,
+                               on_done=self.on_shard_exported, pool=self.job_pool())
+
+    def on_shard_exported(self, future):
+        self.btn_export_shard.setEnabled(True)
+        try:
+            out_path = future.result()
+        except Exception as e:
+            QMessageBox.warning(self, "Export Shard", f"Export failed: {e}")
+            return
+        self.info_textbox.append(f"Exported shard: {out_path}")
+
+    def save_folder_index(self):
+        try:
+            with open(CONFIG_PATH, "w") as f:
+                json.dump({"last_open_dir": self.last_open_dir, "last_index": self.current_index}, f)
+        except Exception as e:
+            print("❌ Failed to save path:", e)
+
+    def save_image_list(self, folder, image_files):
+        # Cache the file list so the next launch can reopen the folder without waiting for a scan
+        names = [os.path.basename(p) for p in image_files]
+
+        def write():
+            tmp_path = IMAGE_LIST_PATH + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"folder": folder, "image_files": names}, f)
+            os.replace(tmp_path, IMAGE_LIST_PATH)
+
+        self.job_pool().submit(write).add_done_callback(
+            lambda f: print("❌ Failed to save image list:", f.exception()) if f.exception() else None)
+
+    @staticmethod
+    def load_image_list(folder):
+        try:
+            with open(IMAGE_LIST_PATH, "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("folder") != folder:
+            return None
+        return [os.path.join(folder, name) for name in cached.get("image_files", [])]
+
+    def restore_last_folder(self):
+        # The scan (if there is no cached index) and the first decode run on the worker pool
+        config = self.load_config()
+        folder = config.get("last_open_dir")
+        if not folder or not os.path.isdir(folder):
+            return
+        index = config.get("last_index", 0)
+
+        def scan_and_decode():
+            image_files = self.load_image_list(folder)
+            from_cache = image_files is not None
+            if not from_cache:
+                image_files = self.scan_folder(folder)
+            i = index if 0 <= index < len(image_files) else 0
+            image = None
+            if image_files and not opens_windowed(image_files[i]):
+                image = load_image_correct_orientation(image_files[i])
+            return image_files, i, image, from_cache
+
+        self.run_in_background(scan_and_decode, on_done=lambda f: self.on_folder_restored(folder, f))
+
+    def on_folder_restored(self, folder, future):
+        if self.image_files:
+            return  # the user opened something else in the meantime
+        try:
+            image_files, index, image, from_cache = future.result()
+        except Exception as e:
+            print(f"Failed to reopen last folder {folder}: {e}")
+            return
+        if image is not None:
+            from concurrent.futures import Future
+            decoded = Future()
+            decoded.set_result(image)
+            self.prefetched[image_files[index]] = decoded
+        if from_cache:
+            print(f"Reopening {folder} from cached index ({len(image_files)} images)")
+        self.open_folder(folder, image_files, index)
+        if from_cache:
+            # The cache is keyed on the image list itself: rescan quietly and adopt any change
+            self.run_in_background(self.scan_folder, folder,
+                                   on_done=lambda f: self.on_folder_rescanned(folder, f), pool=self.job_pool())
+        else:
+            self.save_image_list(folder, image_files)
+
+    def on_folder_rescanned(self, folder, future):
+        if folder != self.last_open_dir or self.shard is not None or self.video is not None:
+            return
+        try:
+            image_files = future.result()
+        except Exception as e:
+            print(f"Failed to rescan {folder}: {e}")
+            return
+        if image_files == self.image_files:
+            return
+        current = self.image_files[self.current_index] if self.image_files else None
+        self.image_files = image_files
+        self.save_image_list(folder, image_files)
+        if current in image_files:
+            self.current_index = image_files.index(current)
+        else:
+            self.current_index = min(self.current_index, len(image_files) - 1)
             self.load_image()
-            try:
-                with open("config_path.json", "w") as f:
-                    json.dump({"last_open_dir": folder}, f)
-            except Exception as e:
-                print("❌ Failed to save path:", e)
+        self.save_folder_index()
 
     def load_image(self):
         if not (0 <= self.current_index < len(self.image_files)):
@@ -678,22 +2280,51 @@ class JSONViewer(QMainWindow):
         print(f"Loading image: {path}")
 
         try:
-            img = load_image_correct_orientation(path)
-            if img.isNull():
-                raise ValueError("Loaded image is null")
-            pixmap = QPixmap.fromImage(img)
-            if pixmap.isNull():
-                raise ValueError("Failed to convert QImage to QPixmap")
-            self.image_display.setPixmap(pixmap)
-            
+            source = None
+            self.pending_source = None
+            if self.shard is None and self.video is None and opens_windowed(path):
+                source = open_windowed_image(path)
+            if source is not None and source.needs_overview():
+                # No usable pyramid: the overview decodes the whole file, so it is built off the UI thread
+                w, h = source.width, source.height
+                self.pending_source = source
+                self.image_display.show_placeholder(f"Building overview of {w}×{h} image...")
+                self.set_window_level_enabled(False)
+                self.run_in_background(self.prepare_source, source,
+                                       on_done=lambda f: self.on_source_prepared(path, source, f))
+            elif source is not None:
+                # Large or high bit depth image: nothing is decoded until the viewport is painted
+                self.image_display.set_source(source)
+                self.setup_window_level(source)
+                w, h = source.width, source.height
+            else:
+                future = self.prefetched.pop(path, None)
+                img = None
+                if future is not None:
+                    if future.done():
+                        img = future.result()
+                    else:
+                        future.cancel()  # still queued or running: don't wait on the pool
+                if img is None:
+                    img = self.decode_image(self.current_index, path, self.shard, self.video)
+                if img.isNull():
+                    raise ValueError("Loaded image is null")
+                pixmap = QPixmap.fromImage(img)
+                if pixmap.isNull():
+                    raise ValueError("Failed to convert QImage to QPixmap")
+                self.image_display.setPixmap(pixmap)
+                self.set_window_level_enabled(False)
+                w, h = img.width(), img.height()
+
             # Update resolution display
-            w, h = img.width(), img.height()
+            self.image_size = (w, h)
             self.resolution_label.setText(f"Resolution: {w}×{h}")
-            
-            print(f"Image loaded successfully: {img.width()}x{img.height()}")
+
+            print(f"Image loaded successfully: {w}x{h}")
         except Exception as e:
             print(f"Error loading image {path}: {e}")
-            self.image_display.setPixmap(QPixmap())
+            self.image_display.clear_image()
+            self.image_size = None
             self.image_display.rects.clear()
             self.image_display.update()
             self.resolution_label.setText("Resolution: --")  # Reset resolution on error
@@ -701,9 +2332,28 @@ class JSONViewer(QMainWindow):
 
         self.image_display.rects.clear()
 
-        w, h = img.width(), img.height()
+        w, h = self.image_size
         txt_path = os.path.splitext(path)[0] + ".txt"
-        if os.path.exists(txt_path):
+        if self.video is not None:
+            frame = self.current_index
+            kind = "keyframe" if frame in self.video.keyframes else "interpolated"
+            for cls_id, cx, cy, ww, hh in self.video.boxes_for_frames([frame])[frame]:
+                if 0 <= cls_id < len(self.class_names):
+                    rect = yolo_to_rect(cx, cy, ww, hh, w, h)
+                    label = self.class_names[cls_id]
+                    self.image_display.rects.append((rect, label))
+                    self.info_textbox.append(f"Loaded {kind} annotation: class={label}, rect={rect}")
+        elif self.shard is not None:
+            class_ids, boxes = self.shard.labels(self.current_index)
+            for cls_id, (cx, cy, ww, hh) in zip(class_ids.tolist(), boxes.tolist()):
+                if 0 <= cls_id < len(self.class_names):
+                    rect = yolo_to_rect(cx, cy, ww, hh, w, h)
+                    label = self.class_names[cls_id]
+                    self.image_display.rects.append((rect, label))
+                    self.info_textbox.append(f"Loaded annotation: class={label}, rect={rect}")
+                else:
+                    self.info_textbox.append(f"Warning: Invalid class ID {cls_id} in {self.shard.path}, skipping.")
+        elif os.path.exists(txt_path):
             try:
                 with open(txt_path, "r") as f:
                     for line in f:
@@ -737,8 +2387,211 @@ class JSONViewer(QMainWindow):
             self.class_list_widget.addItem(label)
 
         self.image_display.update()
+        self.update_diff_overlay()
+        self.stats.enter_image(path)
+        self.update_fast_status()
+        self.prefetch_neighbours()
         print(f"Image and annotations loaded, rects count: {len(self.image_display.rects)}")
 
+    @staticmethod
+    def decode_image(index, path, shard, video):
+        # Takes the source explicitly: a prefetch task runs later, when the list may have been rescanned
+        if video is not None:
+            return video.frame_qimage(index)
+        data = shard.image_bytes(index) if shard is not None else None
+        return load_image_correct_orientation(io.BytesIO(data) if data is not None else path)
+
+    def prefetch_neighbours(self):
+        # Decode the previous and next images on worker threads, so stepping only has to upload a pixmap
+        wanted = {i: self.image_files[i] for i in (self.current_index + 1, self.current_index - 1)
+                  if 0 <= i < len(self.image_files)}
+        self.prefetched = {p: f for p, f in self.prefetched.items() if p in wanted.values()}
+        for i, path in wanted.items():
+            if path not in self.prefetched and not path.lower().endswith(WINDOWED_EXTENSIONS):
+                self.prefetched[path] = self.worker_pool().submit(
+                    self.prefetch_image, i, path, self.shard, self.video)
+
+    @classmethod
+    def prefetch_image(cls, index, path, shard, video):
+        # 16-bit PNGs are shown through open_windowed_image, an 8-bit decode of them would never be used
+        if shard is None and video is None and opens_windowed(path):
+            return None
+        return cls.decode_image(index, path, shard, video)
+
+    def worker_pool(self):
+        if self.prefetch_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.prefetch_pool = ThreadPoolExecutor(max_workers=2)
+        return self.prefetch_pool
+
+    def job_pool(self):
+        # Diffs, merges and exports can take minutes; image decodes must not queue behind them
+        if self.job_pool_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.job_pool_executor = ThreadPoolExecutor(max_workers=2)
+        return self.job_pool_executor
+
+    def run_in_background(self, fn, *args, on_done=None, pool=None):
+        """Run fn on pool (the worker pool by default); on_done(future) is then called on the GUI thread."""
+        future = (pool or self.worker_pool()).submit(fn, *args)
+        if on_done is not None:
+            future.add_done_callback(lambda f: self.background_done.emit((on_done, f)))
+        return future
+
+    def on_background_done(self, item):
+        on_done, future = item
+        on_done(future)
+
+    def select_compare_dir(self):
+        if not self.image_files or self.shard is not None or self.video is not None:
+            QMessageBox.warning(self, "Compare Labels", "Open an image folder first.")
+            return
+        folder = QFileDialog.getExistingDirectory(self, "Compare Labels With", self.last_open_dir)
+        # Cancelling the dialog turns the comparison off
+        self.compare_dir = folder or None
+        self.btn_compare.setStyleSheet("background-color: lightgreen;" if self.compare_dir else "")
+        self.update_diff_overlay()
+        if self.compare_dir:
+            self.info_textbox.append(f"Computing agreement with {self.compare_dir} in the background...")
+            compare_dir = self.compare_dir
+            self.run_in_background(diff_label_dirs, self.last_open_dir, compare_dir,
+                                   on_done=lambda f: self.on_diff_report(compare_dir, f), pool=self.job_pool())
+
+    def on_diff_report(self, compare_dir, future):
+        try:
+            report = future.result()
+        except Exception as e:
+            QMessageBox.warning(self, "Compare Labels", f"Comparison failed: {e}")
+            return
+        self.show_report(f"Agreement: {self.last_open_dir} vs {compare_dir}",
+                         format_diff_report(report, self.class_names))
+
+    def show_report(self, title, text):
+        # Non-modal, so the report can stay open next to the image while browsing
+        if getattr(self, 'report_window', None) is None:
+            self.report_window = QTextEdit()
+            self.report_window.setReadOnly(True)
+            self.report_window.setLineWrapMode(QTextEdit.NoWrap)
+            self.report_window.setFontFamily("monospace")
+            self.report_window.resize(900, 500)
+        self.report_window.setWindowTitle(title)
+        self.report_window.setPlainText(text)
+        self.report_window.show()
+        self.report_window.raise_()
+        self.info_textbox.append(text.splitlines()[0])
+
+    def update_diff_overlay(self):
+        display = self.image_display
+        display.diff_rects = []
+        if self.compare_dir is None or self.image_size is None:
+            display.update()
+            return
+        w, h = self.image_size
+        rows_a, rects_a = [], []
+        for rect, label in display.rects:
+            if label in self.class_names:
+                rows_a.append((self.class_names.index(label), *rect_to_yolo(rect, w, h)))
+                rects_a.append(rect)
+        stem = os.path.splitext(os.path.basename(self.image_files[self.current_index]))[0]
+        rows_b = read_yolo_txt(os.path.join(self.compare_dir, stem + ".txt"))
+        diff = diff_boxes(rows_a, rows_b)
+
+        def name(cls_id):
+            return self.class_names[cls_id] if 0 <= cls_id < len(self.class_names) else str(cls_id)
+
+        for i in diff["removed"]:
+            display.diff_rects.append((rects_a[i], f"- {name(rows_a[i][0])}", "removed"))
+        for j in diff["added"]:
+            display.diff_rects.append((yolo_to_rect(*rows_b[j][1:], w, h), f"+ {name(rows_b[j][0])}", "added"))
+        for _, j, iou in diff["moved"]:
+            display.diff_rects.append((yolo_to_rect(*rows_b[j][1:], w, h), f"~ IoU {iou:.2f}", "moved"))
+        for i, j, _ in diff["relabelled"]:
+            display.diff_rects.append((yolo_to_rect(*rows_b[j][1:], w, h),
+                                       f"{name(rows_a[i][0])} -> {name(rows_b[j][0])}", "relabelled"))
+        self.info_textbox.append("Diff: " + ", ".join(f"{k} {len(v)}" for k, v in diff.items()))
+        display.update()
+
+    def merge_labels(self):
+        if not self.image_files or self.shard is not None or self.video is not None:
+            QMessageBox.warning(self, "3-way Merge", "Open an image folder first.")
+            return
+        if self.needs_save:
+            self.save_yolo_format()
+        base_dir = QFileDialog.getExistingDirectory(self, "Merge: Common Base Labels", self.last_open_dir)
+        if not base_dir:
+            return
+        theirs_dir = QFileDialog.getExistingDirectory(self, "Merge: Other Annotator's Labels", self.last_open_dir)
+        if not theirs_dir:
+            return
+        out_dir = QFileDialog.getExistingDirectory(self, "Merge: Output Folder", self.last_open_dir)
+        if not out_dir:
+            return
+        self.info_textbox.append(f"Merging into {out_dir} in the background (current folder wins conflicts)...")
+        self.btn_merge.setEnabled(False)
+        self.run_in_background(merge_label_dirs, base_dir, self.last_open_dir, theirs_dir, out_dir,
+                               on_done=lambda f: self.on_merge_done(out_dir, f), pool=self.job_pool())
+
+    def on_merge_done(self, out_dir, future):
+        self.btn_merge.setEnabled(True)
+        try:
+            conflicts = future.result()
+        except Exception as e:
+            QMessageBox.warning(self, "3-way Merge", f"Merge failed: {e}")
+            return
+        self.show_report("3-way Merge", format_merge_report(conflicts, out_dir))
+
+    @staticmethod
+    def prepare_source(source):
+        source.get_overview()
+        if source.dtype.itemsize > 1:
+            source.auto_window()  # reads the overview just built
+
+    def on_source_prepared(self, path, source, future):
+        if self.pending_source is not source:
+            return  # the user has moved on to another image
+        self.pending_source = None
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error loading image {path}: {e}")
+            self.image_display.show_placeholder(f"Failed to load {os.path.basename(path)}")
+            return
+        self.image_display.set_source(source)
+        self.setup_window_level(source, auto=False)
+
+    def set_window_level_enabled(self, enabled):
+        for widget in (self.window_spin, self.level_spin, self.btn_auto_window):
+            widget.setEnabled(enabled)
+
+    def setup_window_level(self, source, auto=True):
+        integer = source.dtype.kind in "ui"
+        if auto and source.dtype.itemsize > 1:
+            source.auto_window()
+        for spin in (self.window_spin, self.level_spin):
+            spin.blockSignals(True)
+        # Level can be negative for signed data; QSpinBox values are 32-bit ints
+        self.window_spin.setRange(1, min(source.max_value - source.min_value, 2 ** 31 - 1))
+        self.level_spin.setRange(max(source.min_value, -2 ** 31), min(source.max_value, 2 ** 31 - 1))
+        self.window_spin.setValue(int(round(source.window)))
+        self.level_spin.setValue(int(round(source.level)))
+        for spin in (self.window_spin, self.level_spin):
+            spin.blockSignals(False)
+        self.set_window_level_enabled(integer)
+        self.btn_auto_window.setEnabled(True)
+
+    def apply_window_level(self):
+        source = self.image_display.source
+        if source is not None and source.dtype.kind in "ui":
+            source.set_window(self.window_spin.value(), self.level_spin.value())
+            self.image_display.update()
+
+    def auto_window_level(self):
+        source = self.image_display.source
+        if source is not None:
+            source.auto_window()
+            self.setup_window_level(source, auto=False)
+            self.image_display.update()
+
     def prev_image(self):
         if self.current_index > 0:
             if self.needs_save:
@@ -746,6 +2599,7 @@ class JSONViewer(QMainWindow):
                 self.needs_save = False
             self.current_index -= 1
             self.load_image()
+            self.record_action("prev")
 
     def next_image(self):
         if self.current_index < len(self.image_files) - 1:
@@ -754,6 +2608,7 @@ class JSONViewer(QMainWindow):
                 self.needs_save = False
             self.current_index += 1
             self.load_image()
+            self.record_action("next")
 
     def enter_create_mode(self):
         self.image_display.start_drawing(self.handle_new_rect)
@@ -761,56 +2616,133 @@ class JSONViewer(QMainWindow):
     def handle_new_rect(self, rect):
         if not self.class_names:
             return
-        label, ok = QInputDialog.getItem(self, "Select Label", "Class:", self.class_names, 0, False)
+        label, ok = self.choose_label()
         if ok:
             self.image_display.rects.append((rect, label))
             self.image_display.update()
+            self.needs_save = True
+            self.record_action("create")
 
     def save_yolo_format(self):
         if not (self.image_files and 0 <= self.current_index < len(self.image_files)):
             return
-        confirm = QMessageBox.question(
-            self, "Confirm Save",
-            "Do you want to save current annotations?",
-            QMessageBox.Yes | QMessageBox.No
-        )
-        if confirm != QMessageBox.Yes:
+        if self.shard is not None:
+            return  # read-only; editing is disabled while a shard is open
+        if not self.fast_mode:
+            confirm = QMessageBox.question(
+                self, "Confirm Save",
+                "Do you want to save current annotations?",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if confirm != QMessageBox.Yes:
+                return
+        if self.image_size is None:
             return
 
         path = self.image_files[self.current_index]
-        img = QPixmap(path)
-        w, h = img.width(), img.height()
+        w, h = self.image_size
         save_path = os.path.splitext(path)[0] + ".txt"
         
         # Save annotations in YOLO format (normalized coordinates 0-1)
-        with open(save_path, "w") as f:
-            for rect, label in self.image_display.rects:
-                class_id = self.class_names.index(label)
-                
-                # Convert pixel coordinates to normalized YOLO format (0-1 range)--kua4
-                x = (rect.x() + rect.width() / 2) / w  # center x (normalized)
-                y = (rect.y() + rect.height() / 2) / h  # center y (normalized)
-                ww = rect.width() / w  # width (normalized)
-                hh = rect.height() / h  # height (normalized)
-                
-                # Write in YOLO format: class_id center_x center_y width height
-                f.write(f"{class_id} {x:.6f} {y:.6f} {ww:.6f} {hh:.6f}\n")
-                
-                # Debug info: show both pixel and normalized values
-                self.info_textbox.append(f"Saved: class={label} (ID:{class_id})")
-                self.info_textbox.append(f"  Pixel: x={rect.x():.1f}, y={rect.y():.1f}, w={rect.width():.1f}, h={rect.height():.1f}")
-                self.info_textbox.append(f"  Normalized: x={x:.6f}, y={y:.6f}, w={ww:.6f}, h={hh:.6f}")
-        
-        print(f"[SAVE] {save_path} - Saved in YOLO normalized format")
+        rows = []
+        for rect, label in self.image_display.rects:
+            class_id = self.class_names.index(label)
+            x, y, ww, hh = rect_to_yolo(rect, w, h)
+            rows.append((class_id, x, y, ww, hh))
+
+            # Debug info: show both pixel and normalized values
+            self.info_textbox.append(f"Saved: class={label} (ID:{class_id})")
+            self.info_textbox.append(f"  Pixel: x={rect.x():.1f}, y={rect.y():.1f}, w={rect.width():.1f}, h={rect.height():.1f}")
+            self.info_textbox.append(f"  Normalized: x={x:.6f}, y={y:.6f}, w={ww:.6f}, h={hh:.6f}")
+
+        if self.video is not None:
+            # Saving a video frame makes it an annotated keyframe for interpolation
+            self.video.set_keyframe(self.current_index, rows)
+            print(f"[SAVE] {self.video.keyframes_path} - keyframe {self.current_index}")
+        else:
+            with open(save_path, "w") as f:
+                for class_id, x, y, ww, hh in rows:
+                    # Write in YOLO format: class_id center_x center_y width height
+                    f.write(f"{class_id} {x:.6f} {y:.6f} {ww:.6f} {hh:.6f}\n")
+            print(f"[SAVE] {save_path} - Saved in YOLO normalized format")
         self.needs_save = False
+        if self.compare_dir is not None:
+            self.update_diff_overlay()
 
     def enter_edit_mode(self):
         self.image_display.edit_mode = not self.image_display.edit_mode
         self.btn_edit.setText("Editing ON" if self.image_display.edit_mode else "Edit Mode")
 
 
+def report_startup(timings):
+    total = timings["event loop"]
+    print("Startup profile:")
+    for name, t in timings.items():
+        print(f"  {name:<12} {t * 1000:8.1f} ms")
+    verdict = "OK" if total * 1000 <= STARTUP_TARGET_MS else "OVER TARGET"
+    print(f"  {'target':<12} {STARTUP_TARGET_MS:8.1f} ms  [{verdict}]")
+
+
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Labelimg Yolo Editor")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print a startup timing report and exit")
+    parser.add_argument("--export-shard", nargs=2, metavar=("FOLDER", "OUT"),
+                        help="pack FOLDER's YOLO labels into the shard file OUT and exit")
+    parser.add_argument("--with-images", action="store_true",
+                        help="with --export-shard, also pack the image files")
+    parser.add_argument("--unpack-shard", nargs=2, metavar=("SHARD", "OUT_DIR"),
+                        help="write SHARD back out as a loose image/label folder and exit")
+    parser.add_argument("--open-shard", metavar="SHARD", help="open SHARD in the editor")
+    parser.add_argument("--open-video", metavar="VIDEO", help="open VIDEO as an image sequence")
+    parser.add_argument("--diff-labels", nargs=2, metavar=("DIR_A", "DIR_B"),
+                        help="print per-class agreement between two YOLO label folders and exit")
+    parser.add_argument("--merge-labels", nargs=4, metavar=("BASE", "OURS", "THEIRS", "OUT"),
+                        help="three-way merge YOLO label folders into OUT and exit")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for diff/merge")
+    args, qt_args = parser.parse_known_args()
+
+    if args.export_shard:
+        export_label_shard(*args.export_shard, include_images=args.with_images)
+        sys.exit(0)
+    if args.unpack_shard:
+        unpack_label_shard(*args.unpack_shard)
+        sys.exit(0)
+    if args.diff_labels:
+        classes_path = os.path.join(args.diff_labels[0], "classes.txt")
+        class_names = []
+        if os.path.exists(classes_path):
+            with open(classes_path, "r") as f:
+                class_names = [line.strip() for line in f if line.strip()]
+        print(format_diff_report(diff_label_dirs(*args.diff_labels, workers=args.workers), class_names))
+        sys.exit(0)
+    if args.merge_labels:
+        print(format_merge_report(merge_label_dirs(*args.merge_labels, workers=args.workers), args.merge_labels[3]))
+        sys.exit(0)
+
+    profile_startup = args.profile_startup
+    timings = {"imports": time.perf_counter() - _STARTUP_T0}
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    timings["qapp"] = time.perf_counter() - _STARTUP_T0
     viewer = JSONViewer()
+    timings["window"] = time.perf_counter() - _STARTUP_T0
     viewer.show()
+    timings["show"] = time.perf_counter() - _STARTUP_T0
+
+    def on_event_loop():
+        timings["event loop"] = time.perf_counter() - _STARTUP_T0
+        if profile_startup:
+            report_startup(timings)
+            app.quit()
+        elif args.open_shard:
+            viewer.open_shard(args.open_shard)
+        elif args.open_video:
+            viewer.open_video(args.open_video)
+        else:
+            viewer.restore_last_folder()
+
+    QTimer.singleShot(0, on_event_loop)
     sys.exit(app.exec_())